@@ -1,8 +1,98 @@
 import argparse
-import requests
+import asyncio
+import itertools
+import time
 import logging
+import orjson
 import sys
-import pydot
+from collections import Counter
+from urllib.parse import parse_qs, urlencode, urlparse
+
+try:
+    from . import etag_cache, result_cache
+except ImportError:
+    # Running as a script (see run.sh) rather than as an installed package
+    import etag_cache
+    import result_cache
+
+GITHUB_HEADERS = {'Accept': 'application/vnd.github.v3+json', 'Accept-Encoding': 'gzip'}
+POOL_SIZE = 20
+RATE_LIMIT_THRESHOLD = 10
+PANDAS_THRESHOLD = 5000
+COMMIT_HISTORY_TTL = 300  # seconds
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+REPOSITORY_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    stargazerCount
+    forkCount
+    mentionableUsers { totalCount }
+    releases(first: 3, orderBy: {field: CREATED_AT, direction: DESC}) { nodes { name tagName } }
+    pullRequests(states: [OPEN, CLOSED, MERGED]) { totalCount }
+  }
+}
+"""
+
+class TokenPool:
+    # Rotate requests across several tokens, skipping those close to their rate limit until reset
+    def __init__(self, tokens, min_remaining=RATE_LIMIT_THRESHOLD):
+        self.tokens = list(tokens)
+        self.min_remaining = min_remaining
+        self._cycle = itertools.cycle(self.tokens)
+        self._exhausted_until = {}
+
+    @classmethod
+    def from_string(cls, tokens):
+        return cls(token.strip() for token in tokens.split(',') if token.strip())
+
+    async def acquire(self, resource='core'):
+        now = time.time()
+        for _ in range(len(self.tokens)):
+            token = next(self._cycle)
+            if self._exhausted_until.get((resource, token), 0) <= now:
+                return token
+
+        # Every token is exhausted, so wait for the first reset instead of running into 403s
+        token = min(self.tokens, key=lambda token: self._exhausted_until[(resource, token)])
+        await asyncio.sleep(max(0, self._exhausted_until[(resource, token)] - time.time()))
+        return token
+
+    def update(self, token, headers):
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+
+        # Core, search and GraphQL requests draw from separate budgets
+        key = (headers.get('X-RateLimit-Resource', 'core'), token)
+        if int(remaining) < self.min_remaining:
+            self._exhausted_until[key] = int(headers.get('X-RateLimit-Reset', 0))
+        else:
+            self._exhausted_until.pop(key, None)
+
+def _auth_headers(token):
+    return {'Authorization': f'token {token}'}
+
+def _rate_limit_resource(url):
+    # Mirrors the X-RateLimit-Resource GitHub reports for each request
+    if url == GRAPHQL_URL:
+        return 'graphql'
+    if urlparse(url).path.startswith('/search/'):
+        return 'search'
+    return 'core'
+
+def _httpx():
+    # Imported lazily so `--help` and argument errors don't pay for loading httpx
+    import httpx
+    return httpx
+
+# Share one connection pool across calls so each request skips the TCP + TLS handshake
+def _github_session():
+    httpx = _httpx()
+
+    # HTTP/2 multiplexes the concurrent fan-out over a single TLS connection
+    return httpx.AsyncClient(http2=True, headers=GITHUB_HEADERS, limits=httpx.Limits(max_connections=POOL_SIZE))
 
 def setup_logger(log_file, debug_mode):
     logger = logging.getLogger(__name__)
@@ -17,78 +107,150 @@ def setup_logger(log_file, debug_mode):
     logger.addHandler(handler)
     return logger
 
-def get_github_data(token, user, repo, logger):
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json',
-    }
+def _read_json(response):
+    # orjson parses large PR/commit payloads considerably faster than the stdlib json module
+    return orjson.loads(response.content)
+
+async def cached_get(session, tokens, url):
+    # Send the stored ETag so unchanged resources come back as a cheap 304
+    etag, cached_data, cached_links = etag_cache.get(url)
+    token = await tokens.acquire(_rate_limit_resource(url))
+    headers = _auth_headers(token)
+    if etag:
+        headers['If-None-Match'] = etag
+
+    response = await session.get(url, headers=headers)
+    tokens.update(token, response.headers)
+    if response.status_code == 304:
+        return 200, cached_data, cached_links
+    if response.status_code != 200:
+        return response.status_code, None, response.links
+
+    data = _read_json(response)
+    if 'ETag' in response.headers:
+        etag_cache.put(url, response.headers['ETag'], data, response.links)
+    return response.status_code, data, response.links
+
+async def _fetch_json(session, tokens, url):
+    status, data, _ = await cached_get(session, tokens, url)
+    return status, data
+
+def _last_page(links):
+    # GitHub advertises the page count through the rel="last" Link header
+    last = links.get('last')
+    if not last:
+        return 1
+    query = parse_qs(urlparse(str(last['url'])).query)
+    return int(query['page'][0])
+
+async def _fetch_all_pages(session, tokens, url, per_page=100, concurrency=10):
+    separator = '&' if '?' in url else '?'
+    page_url = f'{url}{separator}per_page={per_page}'
+
+    status, items, links = await cached_get(session, tokens, page_url)
+    if status != 200:
+        return status, None
+
+    # Once the page count is known, fetch the remaining pages concurrently
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch_page(page):
+        async with sem:
+            return await _fetch_json(session, tokens, f'{page_url}&page={page}')
+
+    pages = await asyncio.gather(*[fetch_page(page) for page in range(2, _last_page(links) + 1)])
+    items = list(items)
+    for status, page_items in pages:
+        if status != 200:
+            return status, None
+        items.extend(page_items)
+
+    return 200, items
+
+async def _graphql_repository(session, tokens, query, variables):
+    token = await tokens.acquire(_rate_limit_resource(GRAPHQL_URL))
+    try:
+        response = await session.post(GRAPHQL_URL, json={'query': query, 'variables': variables}, headers=_auth_headers(token))
+    except _httpx().HTTPError as e:
+        return None, str(e)
+    tokens.update(token, response.headers)
+    if response.status_code != 200:
+        return None, f'Status Code: {response.status_code}'
+    body = _read_json(response)
+
+    if body.get('errors'):
+        return None, '; '.join(error['message'] for error in body['errors'])
+    return body['data']['repository'], None
+
+def _count_logins(logins):
+    # For very active repositories let pandas do the counting in C, if it is installed
+    if len(logins) > PANDAS_THRESHOLD:
+        try:
+            import pandas as pd
+        except ImportError:
+            pass
+        else:
+            return [(login, int(count)) for login, count in pd.Series(logins).value_counts().items()]
 
-    base_url = f'https://api.github.com/repos/{user}/{repo}'
-
-    # Get latest 3 releases
-    releases_url = f'{base_url}/releases'
-    logger.debug(f'Fetching releases from {releases_url}')
-    releases_response = requests.get(releases_url, headers=headers)
-    if releases_response.status_code == 200:
-        releases = releases_response.json()[:3]
-    else:
-        logger.error(f'Failed to fetch releases: {releases_response.status_code}')
-        releases = []
-
-    # Get repo info (stars, forks)
-    logger.debug(f'Fetching repo info from {base_url}')
-    repo_response = requests.get(base_url, headers=headers)
-    if repo_response.status_code == 200:
-        repo_info = repo_response.json()
-        forks_count = repo_info.get('forks_count', 0)
-        stargazers_count = repo_info.get('stargazers_count', 0)
-    else:
-        logger.error(f'Failed to fetch repo info: {repo_response.status_code}')
-        forks_count = 0
-        stargazers_count = 0
-
-    # Get contributors
-    contributors_url = f'{base_url}/contributors'
-    logger.debug(f'Fetching contributors from {contributors_url}')
-    contributors_response = requests.get(contributors_url, headers=headers)
-    if contributors_response.status_code == 200:
-        contributors = contributors_response.json()
-        contributors_count = len(contributors)
-    else:
-        logger.error(f'Failed to fetch contributors: {contributors_response.status_code}')
-        contributors_count = 0
-
-    # Get pull requests
-    pulls_url = f'{base_url}/pulls?state=all'
-    logger.debug(f'Fetching pull requests from {pulls_url}')
-    pulls_response = requests.get(pulls_url, headers=headers)
-    if pulls_response.status_code == 200:
-        pulls = pulls_response.json()
-        pulls_count = len(pulls)
-    else:
-        logger.error(f'Failed to fetch pull requests: {pulls_response.status_code}')
-        pulls_count = 0
+    return Counter(logins).most_common()
 
-    # Get contributors pull request counts
-    contributors_pulls = {}
-    for pr in pulls:
-        user = pr['user']['login']
-        if user in contributors_pulls:
-            contributors_pulls[user] += 1
-        else:
-            contributors_pulls[user] = 1
+async def _fetch_pull_request_authors(session, tokens, user, repo, logger):
+    # GraphQL can only walk pull requests through a serial cursor, so page the REST listing concurrently instead
+    pulls_url = f'https://api.github.com/repos/{user}/{repo}/pulls?state=all'
+    logger.debug('Fetching pull requests from %s', pulls_url)
+    try:
+        status, pulls = await _fetch_all_pages(session, tokens, pulls_url)
+    except _httpx().HTTPError as e:
+        logger.error('Failed to fetch pull requests: %s', e)
+        return []
+
+    if status != 200:
+        logger.error('Failed to fetch pull requests: %s', status)
+        return []
 
-    contributors_pulls_sorted = sorted(contributors_pulls.items(), key=lambda item: item[1], reverse=True)
+    return [login for login in ((pr.get('user') or {}).get('login') for pr in pulls) if login]
+
+async def get_github_data_async(tokens, user, repo, logger):
+    variables = {'owner': user, 'name': repo}
+
+    # A single GraphQL query returns releases, stars, forks, contributors and the pull request total,
+    # while the pull request authors are fetched alongside it
+    logger.debug('Fetching repository data for %s/%s from %s', user, repo, GRAPHQL_URL)
+    async with _github_session() as session:
+        (repository, error), logins = await asyncio.gather(
+            _graphql_repository(session, tokens, REPOSITORY_QUERY, variables),
+            _fetch_pull_request_authors(session, tokens, user, repo, logger),
+        )
+
+    # Get contributors pull request counts
+    contributors_pulls_sorted = _count_logins(logins)
+
+    # Only blank the fields GraphQL supplies, the pull request authors were fetched separately
+    if repository is None:
+        logger.error('Failed to fetch repository data: %s', error)
+        return {
+            'releases': [],
+            'forks_count': 0,
+            'stargazers_count': 0,
+            'contributors_count': 0,
+            'pulls_count': 0,
+            'contributors_pulls_sorted': contributors_pulls_sorted
+        }
+
+    releases = [{'name': release['name'], 'tag_name': release['tagName']} for release in repository['releases']['nodes']]
 
     return {
         'releases': releases,
-        'forks_count': forks_count,
-        'stargazers_count': stargazers_count,
-        'contributors_count': contributors_count,
-        'pulls_count': pulls_count,
+        'forks_count': repository['forkCount'],
+        'stargazers_count': repository['stargazerCount'],
+        'contributors_count': repository['mentionableUsers']['totalCount'],
+        'pulls_count': repository['pullRequests']['totalCount'],
         'contributors_pulls_sorted': contributors_pulls_sorted
     }
 
+def get_github_data(tokens, user, repo, logger):
+    return asyncio.run(get_github_data_async(tokens, user, repo, logger))
+
 def print_github_data(data):
     print("Latest 3 releases:")
     for release in data['releases']:
@@ -104,129 +266,142 @@ def print_github_data(data):
         print(f"- {contributor}: {pr_count} pull requests")
 
 
-def get_parent_commit(token, user, repo, commit, logger):
-    commit_hash = commit['sha']
-    url = f"https://api.github.com/repos/{user}/{repo}/commits/{commit['parents'][0]['sha']}"
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json',
-    }
+async def fetch_commit(session, sem, tokens, user, repo, sha, logger):
+    url = f"https://api.github.com/repos/{user}/{repo}/commits/{sha}"
 
     try:
-        logger.info(f"Fetching commit information for commit '{commit_hash}'")
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+        async with sem:
+            logger.info("Fetching commit information for commit '%s'", sha)
+            status, commit, _ = await cached_get(session, tokens, url)
 
-        parent_commit = response.json()
+        if status != 200:
+            logger.error("Failed to fetch commit information for commit '%s'. Status Code: %s", sha, status)
+            return None
 
-        logger.debug(f"Parent commit hash for commit '{commit_hash}' is: {commit['parents'][0]['sha']}")
-        return parent_commit
+        return commit
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to fetch commit information for commit '{commit_hash}': {e}")
+    except _httpx().HTTPError as e:
+        logger.error("Failed to fetch commit information for commit '%s': %s", sha, e)
         return None
 
-def get_commits_for_branch(token, user, repo, branch_name):
-    # GitHub API endpoint for fetching pull requests merged into master
-    url = f"https://api.github.com/repos/{user}/{repo}/pulls"
-    params = {
-        "state": "closed",
-        "base": "master",
-        "per_page": 100  # Increase per_page to fetch more PRs if needed
-    }
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+async def fetch_parent_commits(session, tokens, user, repo, commits, logger, concurrency=10):
+    # Only fetch parents that are not already part of the batch, keeping them in commit order
+    have = {c['sha'] for c in commits}
+    missing = list(dict.fromkeys(p['sha'] for c in commits for p in c['parents'] if p['sha'] not in have))
+
+    # Bound the number of in-flight requests to stay friendly with GitHub's rate limits
+    sem = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[fetch_commit(session, sem, tokens, user, repo, sha, logger) for sha in missing])
+
+async def get_commits_for_branch(session, tokens, user, repo, branch_name, logger):
+    # Search for the pull request merged from the branch into master instead of scanning every closed PR
+    # Only the newest hit is used, matching the newest-first /pulls listing, so don't download a full page of results
+    query = urlencode({'q': f'repo:{user}/{repo} head:{branch_name} base:master is:pr is:merged', 'sort': 'created', 'order': 'desc', 'per_page': 1})
+    search_url = f"https://api.github.com/search/issues?{query}"
+
+    status, search_results = await _fetch_json(session, tokens, search_url)
+    if status != 200:
+        logger.error("Failed to search pull requests. Status Code: %s", status)
+        return None, None  # Failed to search pull requests
+
+    if not search_results['items']:
+        logger.warning("No merged pull request found for branch '%s'.", branch_name)
+        return None, None  # Branch name not found among merged branches
+
+    # Search results carry no merge information, so fetch the pull request itself
+    pr_url = f"https://api.github.com/repos/{user}/{repo}/pulls/{search_results['items'][0]['number']}"
+    status, pr = await _fetch_json(session, tokens, pr_url)
+    if status != 200:
+        logger.error("Failed to fetch pull request. Status Code: %s", status)
+        return None, None  # Failed to fetch pull request
+
+    commits_url = pr['commits_url'].replace("{/sha}", "")  # Remove unnecessary part from URL
+
+    # Fetch commits for the current branch
+    status, commits = await _fetch_all_pages(session, tokens, commits_url)
+    if status != 200:
+        logger.error("Failed to fetch commits for branch '%s'. Status Code: %s", branch_name, status)
+        return None, None  # Failed to fetch commits
+
+    merged_commit_hash = pr['merge_commit_sha'] if pr['merge_commit_sha'] else None
+
+    # Return all commits and merged commit hash
+    return commits, merged_commit_hash
+
+async def _fetch_commit_history(tokens, user, repo, branch_name, logger):
+    # Reuse a recent result for the same branch so repeated runs skip the network entirely
+    key = f'{user}/{repo}/{branch_name}'
+    cached = result_cache.get(key, COMMIT_HISTORY_TTL)
+    if cached is not None:
+        logger.debug("Using cached commit history for branch '%s'", branch_name)
+        commits, merged_commit_hash, parent_commits = cached
+        return commits, merged_commit_hash, parent_commits
+
+    async with _github_session() as session:
+        try:
+            commits, merged_commit_hash = await get_commits_for_branch(session, tokens, user, repo, branch_name, logger)
+        except _httpx().HTTPError as e:
+            logger.error("Failed to fetch commits for branch '%s': %s", branch_name, e)
+            return None, None, []
+        if not commits:
+            return None, None, []
+
+        parent_commits = await fetch_parent_commits(session, tokens, user, repo, commits, logger)
+
+    # Don't replay a transient parent fetch failure for the whole TTL
+    if all(parent_commits):
+        result_cache.put(key, [commits, merged_commit_hash, parent_commits])
+    return commits, merged_commit_hash, parent_commits
+
+
+def dot_escape(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+def create_commit_graph(tokens, user, repo, branch_name, output_file, logger):
+    # Fetch commits for the specified branch, the merged commit hash and the commits' parents
+    commits, merged_commit_hash, parent_commits = asyncio.run(_fetch_commit_history(tokens, user, repo, branch_name, logger))
+    if not commits:
+        logger.error("Failed to fetch commits for branch '%s'. Exiting.", branch_name)
+        return None
 
-    # Send GET request to GitHub API
-    response = requests.get(url, params=params, headers=headers)
-
-    # Check if request was successful
-    if response.status_code == 200:
-        pull_requests = response.json()
-
-        # Check if the provided branch name exists among merged branches
-        for pr in pull_requests:
-            if pr['head']['ref'] == branch_name and pr['merged_at']:
-                commits_url = pr['commits_url'].replace("{/sha}", "")  # Remove unnecessary part from URL
-
-                # Fetch commits for the current branch
-                response_commits = requests.get(commits_url, headers=headers)
-                if response_commits.status_code == 200:
-                    commits = response_commits.json()
-                    merged_commit_hash = pr['merge_commit_sha'] if pr['merge_commit_sha'] else None
-
-                    # Return all commits and merged commit hash
-                    return commits, merged_commit_hash
-                else:
-                    logger.error(f"Failed to fetch commits for branch '{branch_name}'. Status Code: {response_commits.status_code}")
-                    return None, None  # Failed to fetch commits
-        else:
-            logger.warning(f"No merged pull request found for branch '{branch_name}'.")
-            return None, None  # Branch name not found among merged branches
-    else:
-        logger.error(f"Failed to fetch pull requests. Status Code: {response.status_code}")
-        return None, None  # Failed to fetch pull requests
+    # Add parent commits that are not part of the branch (e.g. the last commit before branch-out)
+    commits = [parent_commit for parent_commit in parent_commits if parent_commit] + commits
 
+    # Write the graph straight to the .dot file instead of going through a pydot object graph
+    with open(output_file, 'w') as f:
+        f.write('digraph G {\n')
 
-def create_commit_graph(token, user, repo, branch_name, output_file, logger):
-    # Fetch commits for the specified branch and get merged commit hash
-    commits, merged_commit_hash = get_commits_for_branch(token, user, repo, branch_name)
-    if not commits:
-        logger.error(f"Failed to fetch commits for branch '{branch_name}'. Exiting.")
-        return None
-    
-    # Add last commit before branch-out 
-    parent_commit = get_parent_commit(token, user, repo, commits[0], logger)
-    commits = [parent_commit] + commits
-
-    # Initialize a directed graph
-    graph = pydot.Dot(graph_type='digraph')
-
-    # Add nodes for each commit
-    nodes = {}
-    for commit in commits:
-        node = pydot.Node(commit['sha'], label=commit['commit']['message'].splitlines()[0])
-        graph.add_node(node)
-        nodes[commit['sha']] = node
-
-    # Add merged commit hash as the last node in the graph
-    if merged_commit_hash:
-        merged_node = pydot.Node(merged_commit_hash, label=f"Merged Commit: {merged_commit_hash[:7]}")
-        graph.add_node(merged_node)
-
-        # Add edge from last commit to merged commit
-        last_commit_sha = commits[-1]['sha']
-        if last_commit_sha in nodes:
-            edge_to_merged = pydot.Edge(nodes[last_commit_sha], merged_node)
-            graph.add_edge(edge_to_merged)
-        else:
-            logger.warning(f"Last commit SHA '{last_commit_sha}' not found among nodes.")
-
-    # Add edges between commits (parent relationships)
-    for commit in commits:
-        sha = commit['sha']
-        parents = commit['parents']
-        for parent in parents:
-            parent_sha = parent['sha']
-            if parent_sha in nodes:
-                is_first_commit = False
-                edge = pydot.Edge(nodes[parent_sha], nodes[sha])
-                graph.add_edge(edge)
-
-    first_commit_sha = commits[0]['sha']  # Assuming last commit in list is the oldest
-    first_commit_node = nodes[first_commit_sha]
-    edge_to_merge = pydot.Edge(first_commit_node, merged_node)
-    graph.add_edge(edge_to_merge)
-
-    # Write the graph to a .dot file
-    graph.write(output_file)
-    logger.info(f"Commit graph generated and saved as '{output_file}'")
+        # Add nodes for each commit
+        nodes = set()
+        for commit in commits:
+            f.write(f'"{commit["sha"]}" [label="{dot_escape(commit["commit"]["message"].splitlines()[0])}"];\n')
+            nodes.add(commit['sha'])
+
+        # Add merged commit hash as the last node in the graph
+        if merged_commit_hash:
+            f.write(f'"{merged_commit_hash}" [label="Merged Commit: {merged_commit_hash[:7]}"];\n')
+
+            # Add edge from last commit to merged commit
+            last_commit_sha = commits[-1]['sha']
+            if last_commit_sha in nodes:
+                f.write(f'"{last_commit_sha}" -> "{merged_commit_hash}";\n')
+            else:
+                logger.warning("Last commit SHA '%s' not found among nodes.", last_commit_sha)
+
+        # Add edges between commits (parent relationships)
+        f.writelines(f'"{p["sha"]}" -> "{c["sha"]}";\n' for c in commits for p in c['parents'] if p['sha'] in nodes)
+
+        if merged_commit_hash:
+            first_commit_sha = commits[0]['sha']  # Assuming last commit in list is the oldest
+            f.write(f'"{first_commit_sha}" -> "{merged_commit_hash}";\n')
+
+        f.write('}\n')
+
+    logger.info("Commit graph generated and saved as '%s'", output_file)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Get GitHub repository information and create commit graph.')
-    parser.add_argument('token', help='GitHub token')
+    parser.add_argument('token', help='GitHub token, or a comma-separated list of tokens to rotate between')
     parser.add_argument('user', help='GitHub username')
     parser.add_argument('repo', help='GitHub repository name')
     parser.add_argument('--log_to_file', metavar='LOG_FILE', help='Log to a specified file instead of stdout')
@@ -238,9 +413,13 @@ if __name__ == "__main__":
 
     logger = setup_logger(args.log_to_file, args.debug)
 
-    github_data = get_github_data(args.token, args.user, args.repo, logger)
+    tokens = TokenPool.from_string(args.token)
+    if not tokens.tokens:
+        parser.error('at least one GitHub token is required')
+
+    github_data = get_github_data(tokens, args.user, args.repo, logger)
     print_github_data(github_data)
 
     if args.branch:
-        create_commit_graph(args.token, args.user, args.repo, args.branch, args.graph_file, logger)
+        create_commit_graph(tokens, args.user, args.repo, args.branch, args.graph_file, logger)
 
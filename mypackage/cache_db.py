@@ -0,0 +1,16 @@
+import os
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mypackage')
+
+def open_cache_db(path, table, columns, create_sql):
+    import sqlite3
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+
+    # The stores are only caches, so a table from an older layout is simply rebuilt
+    existing = [(name, column_type) for _, name, column_type, *_ in connection.execute(f'PRAGMA table_info({table})')]
+    if existing and existing != columns:
+        connection.execute(f'DROP TABLE {table}')
+    connection.execute(create_sql)
+    return connection
@@ -0,0 +1,33 @@
+import os
+
+import orjson
+
+try:
+    from . import cache_db
+except ImportError:
+    # Running as a script (see run.sh) rather than as an installed package
+    import cache_db
+
+CACHE_PATH = os.path.join(cache_db.CACHE_DIR, 'etags.db')
+
+# A 304 need not repeat the Link header, so the pagination links are stored with the body
+COLUMNS = [('url', 'TEXT'), ('etag', 'TEXT'), ('body', 'BLOB'), ('links', 'BLOB')]
+
+_connection = None
+
+def _connect():
+    global _connection
+    if _connection is None:
+        _connection = cache_db.open_cache_db(CACHE_PATH, 'etags', COLUMNS, 'CREATE TABLE IF NOT EXISTS etags (url TEXT PRIMARY KEY, etag TEXT NOT NULL, body BLOB NOT NULL, links BLOB NOT NULL)')
+    return _connection
+
+def get(url):
+    row = _connect().execute('SELECT etag, body, links FROM etags WHERE url = ?', (url,)).fetchone()
+    if row is None:
+        return None, None, {}
+    etag, body, links = row
+    return etag, orjson.loads(body), orjson.loads(links)
+
+def put(url, etag, data, links):
+    with _connect() as connection:
+        connection.execute('INSERT OR REPLACE INTO etags (url, etag, body, links) VALUES (?, ?, ?, ?)', (url, etag, orjson.dumps(data), orjson.dumps(links)))
@@ -0,0 +1,35 @@
+import os
+import time
+
+import orjson
+
+try:
+    from . import cache_db
+except ImportError:
+    # Running as a script (see run.sh) rather than as an installed package
+    import cache_db
+
+CACHE_PATH = os.path.join(cache_db.CACHE_DIR, 'results.db')
+
+COLUMNS = [('key', 'TEXT'), ('cached_at', 'REAL'), ('body', 'BLOB')]
+
+_connection = None
+
+def _connect():
+    global _connection
+    if _connection is None:
+        _connection = cache_db.open_cache_db(CACHE_PATH, 'results', COLUMNS, 'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, cached_at REAL NOT NULL, body BLOB NOT NULL)')
+    return _connection
+
+def get(key, max_age):
+    row = _connect().execute('SELECT cached_at, body FROM results WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    cached_at, body = row
+    if time.time() - cached_at >= max_age:
+        return None
+    return orjson.loads(body)
+
+def put(key, data):
+    with _connect() as connection:
+        connection.execute('INSERT OR REPLACE INTO results (key, cached_at, body) VALUES (?, ?, ?)', (key, time.time(), orjson.dumps(data)))
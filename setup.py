@@ -6,11 +6,13 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=[
-        'requests',
-        'pydot',
-        'graphviz',
+        'httpx[http2]',
+        'orjson',
         'argparse',
     ],
+    extras_require={
+        'pandas': ['pandas'],
+    },
     entry_points={
         'console_scripts': [
             'mypackage=mypackage.__init__:main',
@@ -27,5 +29,5 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.8',
 )